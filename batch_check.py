@@ -0,0 +1,119 @@
+"""
+End-to-end check of the batch mode against the local file-based endpoint, with no API access.
+Plays a small tournament with a scripted client, kills it part way through (once between rounds and
+once in the middle of writing results), resumes it from disk and checks every game finishes with
+exactly one record per game and per turn. One extra game's oracle requests always fail, and it must
+end as a recorded failure after max_attempts instead of being resubmitted forever.
+
+Run with: python batch_check.py
+"""
+import os
+import json
+import tempfile
+from types import SimpleNamespace
+from bot import Seeker, Oracle
+from game_environment import GameEnvironment
+from game_store import GameStore
+from batch_runner import BatchTournament, LocalBatchEndpoint
+from country import country_choice
+from attributes import ATTRIBUTE_SPACE
+
+questions = 3
+games = 3
+BROKEN_COUNTRY = "Atlantis" # every oracle request for this game fails
+
+
+class ScriptedResponses:
+    def create(self, model: str, instructions: str, input: str):
+        return SimpleNamespace(output_text=self.reply(input))
+
+    def reply(self, input: str) -> str:
+        if f"Hidden country: {BROKEN_COUNTRY}" in input:
+            raise ValueError("input rejected")
+        if "output your next" in input:
+            return "Is it in Europe?"
+        if "final guess" in input:
+            return "France"
+        if "Now deliver your final answer" in input:
+            return "Yes."
+        if "CORRECT_ANSWER: <" in input:
+            return "CORRECT_ANSWER: Yes\nIMPACT: x\nSTRATEGY: y"
+        if "CANDIDATE: <country>" in input:
+            return "CANDIDATE: France\nCANDIDATE: Spain\nCANDIDATE: Italy"
+        if "REASONING: <" in input:
+            return "REASONING: x\nCANDIDATES: France, Spain, Italy\nSTRATEGY: y\nBRANCH: 1"
+        return "QUESTION: Is it in Europe?\nIF_YES_COUNT: 40\nIF_NO_COUNT: 156"
+
+
+class ScriptedClient:
+    responses = ScriptedResponses()
+
+
+class Crash(Exception):
+    pass
+
+
+def main():
+    directory = tempfile.mkdtemp(prefix="batch_check_")
+    client = ScriptedClient()
+    store = GameStore(os.path.join(directory, "results"))
+
+    def make_game() -> GameEnvironment:
+        seeker = Seeker(client=client, model="scripted", question_budget=questions, attribute_space=ATTRIBUTE_SPACE)
+        oracle = Oracle(client=client, model="scripted", country_choice=country_choice, question_budget=questions, attribute_space=ATTRIBUTE_SPACE)
+        game = GameEnvironment(seeker, oracle, store=store)
+        seeker.game = game
+        oracle.game = game
+        return game
+
+    endpoint = LocalBatchEndpoint(client, directory)
+
+    # First process: two rounds, then stops between rounds
+    tournament = BatchTournament(directory, make_game, endpoint)
+    tournament.add_games(games + 1)
+    broken = next(iter(tournament.games.values()))
+    broken.oracle.hidden_country = BROKEN_COUNTRY
+    tournament.save_game(broken)
+    for _ in range(2):
+        tournament.submit()
+        tournament.poll()
+
+    # Second process: dies after writing a game's turn record but before recording that it was written
+    tournament = BatchTournament(directory, make_game, endpoint)
+    flush_game = tournament.flush_game
+
+    def crashing_flush(game):
+        if not any(kind == "turn" for kind, _, _ in game.outbox):
+            return flush_game(game)
+        tournament.save_game(game)
+        game.flush()
+        raise Crash()
+
+    tournament.flush_game = crashing_flush
+    while True:
+        tournament.submit()
+        try:
+            tournament.poll()
+        except Crash:
+            break
+    tournament.flush_game = flush_game
+
+    # Third process: resumes and finishes
+    tournament = BatchTournament(directory, make_game, endpoint)
+    tournament.run(poll_interval=0)
+
+    assert tournament.done(), "not every game finished"
+    records = list(store.iter_games())
+    game_ids = [game["game_id"] for game in records]
+    failed = [game["game_id"] for game in records if game.get("failed")]
+    turn_keys = [(turn["game_id"], turn["turn"]) for turn in store.iter_turns()]
+    assert sorted(game_ids) == sorted(tournament.games), f"expected one record per game, got {len(game_ids)}"
+    assert failed == [broken.game_id], f"expected only the broken game to fail, got {failed}"
+    assert len(turn_keys) == len(set(turn_keys)) == games * questions, f"duplicate or missing turn records: {len(turn_keys)}"
+
+    print(json.dumps({"directory": directory, "rounds": tournament.round, "games": len(game_ids), "failed": len(failed), "turns": len(turn_keys)}))
+    print("batch check passed")
+
+
+if __name__ == "__main__":
+    main()
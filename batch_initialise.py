@@ -0,0 +1,53 @@
+from openai import OpenAI
+from bot import Seeker, Oracle
+from game_environment import GameEnvironment
+from game_store import GameStore
+from batch_runner import BatchTournament, OpenAIBatchEndpoint, LocalBatchEndpoint
+from country import country_choice
+import os
+import sys
+from attributes import ATTRIBUTE_SPACE
+
+client = OpenAI(api_key=os.getenv("OPENAI_API_KEY"))
+
+#Parameters
+model = "gpt-5-nano"
+questions = 8
+games = 100
+directory = "batch_run"
+local = "--local" in sys.argv # answer batches straight away instead of going through the Batch API
+sequential_branches = False # True trades extra batch rounds for fewer branch calls
+
+store = GameStore(os.path.join(directory, "results"))
+
+
+def make_game() -> GameEnvironment:
+    seeker = Seeker(
+        client=client,
+        model=model,
+        question_budget=questions,
+        attribute_space=ATTRIBUTE_SPACE,
+    )
+
+    oracle = Oracle(
+        client = client,
+        model=model,
+        country_choice=country_choice,
+        question_budget=questions,
+        attribute_space=ATTRIBUTE_SPACE,
+    )
+
+    game = GameEnvironment(seeker, oracle, store=store)
+    seeker.game = game
+    oracle.game = game
+    return game
+
+
+endpoint = LocalBatchEndpoint(client, directory) if local else OpenAIBatchEndpoint(client, directory)
+tournament = BatchTournament(directory, make_game, endpoint, sequential_branches=sequential_branches)
+
+# Re-running the script picks up an existing tournament instead of starting new games
+if not tournament.games:
+    tournament.add_games(games)
+
+tournament.run(poll_interval=0 if local else 60)
@@ -0,0 +1,306 @@
+import os
+import json
+import time
+import uuid
+
+
+BATCH_URL = "/v1/responses"
+
+
+def output_text(body: dict) -> str:
+    """
+    Pulls the text out of a raw Responses API body, the same text the SDK exposes as output_text.
+    """
+    texts = [
+        content["text"]
+        for item in body.get("output", [])
+        if item.get("type") == "message"
+        for content in item.get("content", [])
+        if content.get("type") == "output_text"
+    ]
+    return "".join(texts).strip()
+
+
+def error_message(result: dict) -> str:
+    """
+    Pulls a readable message out of a failed batch result line, whether the error is on the line or in the response body.
+    """
+    error = result.get("error")
+    if error:
+        return error.get("message", json.dumps(error)) if isinstance(error, dict) else str(error)
+    response = result.get("response") or {}
+    body_error = (response.get("body") or {}).get("error") or {}
+    return f"status {response.get('status_code')}: {body_error.get('message', 'no message')}"
+
+
+class OpenAIBatchEndpoint:
+    """
+    Submits batch files to the OpenAI Batch API and downloads the output once a batch has completed.
+    """
+    def __init__(self, client, directory: str):
+        self.client = client
+        self.directory = directory
+
+    def submit(self, batch_path: str) -> str:
+        with open(batch_path, "rb") as f:
+            batch_file = self.client.files.create(file=f, purpose="batch")
+        batch = self.client.batches.create(
+            input_file_id=batch_file.id,
+            endpoint=BATCH_URL,
+            completion_window="24h",
+        )
+        return batch.id
+
+    def results(self, batch_id: str):
+        batch = self.client.batches.retrieve(batch_id)
+        if batch.status not in ("completed", "failed", "expired", "cancelled"):
+            return None
+
+        results_path = os.path.join(self.directory, f"{batch_id}_output.jsonl")
+        with open(results_path, "w") as f:
+            # Failed requests are in the error file; a failed or expired batch may have neither file
+            for file_id in (batch.output_file_id, batch.error_file_id):
+                if file_id:
+                    text = self.client.files.content(file_id).text
+                    f.write(text if text.endswith("\n") else text + "\n")
+        return results_path
+
+
+class LocalBatchEndpoint:
+    """
+    File-based stand-in for the batch endpoint.
+    Answers every line of a batch file with the given client and writes an output file
+    in the same shape the Batch API returns, so a tournament can be run end to end without it.
+    """
+    def __init__(self, client, directory: str):
+        self.client = client
+        self.directory = directory
+
+    def submit(self, batch_path: str) -> str:
+        batch_id = f"local_{uuid.uuid4().hex}"
+        results_path = os.path.join(self.directory, f"{batch_id}_output.jsonl")
+
+        with open(batch_path, "r") as batch, open(results_path, "w") as results:
+            for line in batch:
+                request = json.loads(line)
+                try:
+                    response = self.client.responses.create(**request["body"])
+                    status_code = 200
+                    body = {"output": [{"type": "message", "content": [{"type": "output_text", "text": response.output_text}]}]}
+                except Exception as e:
+                    # Reported per request like the Batch API's error file, instead of failing the whole batch
+                    status_code = 400
+                    body = {"error": {"message": str(e)}}
+                results.write(json.dumps({
+                    "custom_id": request["custom_id"],
+                    "response": {"status_code": status_code, "body": body},
+                    "error": None,
+                }) + "\n")
+        return batch_id
+
+    def results(self, batch_id: str):
+        results_path = os.path.join(self.directory, f"{batch_id}_output.jsonl")
+        return results_path if os.path.exists(results_path) else None
+
+
+class BatchTournament:
+    """
+    Plays many games at once through a batch endpoint.
+    Every game's pending LLM requests are written into one batch file per round; when a batch's
+    results are ingested each game whose requests are all answered advances to its next state.
+    Game state is saved to disk after every change, so the tournament can be resumed by a new process.
+    By default each turn's branches all go into one round; sequential_branches=True issues them one round
+    at a time so the convergence cut-off can save calls, at the cost of up to n_branches - min_branches extra rounds.
+    A request that has been sent max_attempts times without an answer fails its game, which is recorded and finished.
+    """
+    def __init__(self, directory: str, make_game, endpoint, sequential_branches: bool = False, verbose: bool = False, max_attempts: int = 3):
+        self.directory = directory
+        self.games_dir = os.path.join(directory, "games")
+        self.state_path = os.path.join(directory, "tournament.json")
+        self.make_game = make_game
+        self.endpoint = endpoint
+        self.sequential_branches = sequential_branches
+        self.verbose = verbose
+        self.max_attempts = max_attempts
+        os.makedirs(self.games_dir, exist_ok=True)
+
+        self.games = {}
+        self.outstanding = {}
+        self.round = 0
+        self.load()
+
+    def load(self):
+        if os.path.exists(self.state_path):
+            with open(self.state_path, "r") as f:
+                state = json.load(f)
+            self.outstanding = state["outstanding"]
+            self.round = state["round"]
+
+        for name in sorted(os.listdir(self.games_dir)):
+            if not name.endswith(".json"):
+                continue
+            with open(os.path.join(self.games_dir, name), "r") as f:
+                snapshot = json.load(f)
+            game = self.make_game()
+            game.restore(snapshot)
+            game.sequential_branches = self.sequential_branches
+            game.verbose = self.verbose
+            self.games[game.game_id] = game
+            # A crash between saving and flushing leaves writes in the outbox; undo any part already written and redo them
+            if game.outbox:
+                game.rewind_flush()
+                self.flush_game(game)
+
+    def save(self):
+        with open(self.state_path, "w") as f:
+            json.dump({"outstanding": self.outstanding, "round": self.round}, f)
+
+    def save_game(self, game):
+        path = os.path.join(self.games_dir, f"{game.game_id}.json")
+        with open(path + ".tmp", "w") as f:
+            json.dump(game.snapshot(), f)
+        os.replace(path + ".tmp", path)
+
+    def flush_game(self, game):
+        # Saved first so the outbox and file offsets survive a crash during the flush
+        self.save_game(game)
+        game.flush()
+        self.save_game(game)
+
+    def add_games(self, count: int):
+        for _ in range(count):
+            game = self.make_game()
+            if game.game_id is None:
+                game.game_id = uuid.uuid4().hex
+            game.sequential_branches = self.sequential_branches
+            game.verbose = self.verbose
+            # Each game keeps its own candidate and thought logs so concurrent games don't overwrite each other
+            game.seeker.candidate_file = os.path.join(self.games_dir, f"{game.game_id}_candidates.txt")
+            game.seeker.thought_file = os.path.join(self.games_dir, f"{game.game_id}_thoughts.txt")
+            game.start()
+            self.games[game.game_id] = game
+            self.flush_game(game)
+
+    def done(self) -> bool:
+        return all(game.state == "done" for game in self.games.values())
+
+    def submit(self):
+        """
+        Writes every unanswered request that is not already in flight into a new batch file and submits it.
+        Returns the batch id, or None if there was nothing to send.
+        """
+        in_flight = {custom_id for ids in self.outstanding.values() for custom_id in ids}
+        batch_path = os.path.join(self.directory, f"batch_{self.round}.jsonl")
+        custom_ids = []
+        sent = []
+
+        with open(batch_path, "w") as f:
+            for game in list(self.games.values()):
+                for i, request in enumerate(game.pending):
+                    custom_id = f"{game.game_id}:{game.step}:{i}"
+                    if request["response"] is not None or custom_id in in_flight:
+                        continue
+                    if request["attempts"] >= self.max_attempts:
+                        error = f"request {custom_id} failed after {request['attempts']} attempts: {request['error']}"
+                        print(f"Game {game.game_id} failed: {error}")
+                        game.fail(error)
+                        self.flush_game(game)
+                        break
+                    request["attempts"] += 1
+                    if game not in sent:
+                        sent.append(game)
+                    f.write(json.dumps({
+                        "custom_id": custom_id,
+                        "method": "POST",
+                        "url": BATCH_URL,
+                        "body": request["body"],
+                    }) + "\n")
+                    custom_ids.append(custom_id)
+
+        if not custom_ids:
+            os.remove(batch_path)
+            return None
+
+        for game in sent:
+            if game.state != "done":
+                self.save_game(game)
+        batch_id = self.endpoint.submit(batch_path)
+        self.outstanding[batch_id] = custom_ids
+        self.round += 1
+        self.save()
+        return batch_id
+
+    def poll(self) -> int:
+        """
+        Ingests every outstanding batch whose results are ready. Returns how many were ingested.
+        """
+        ingested = 0
+        for batch_id in list(self.outstanding):
+            results_path = self.endpoint.results(batch_id)
+            if results_path is None:
+                continue
+            answered = self.ingest(results_path)
+            for custom_id in self.outstanding[batch_id]:
+                if custom_id not in answered:
+                    self.record_error(custom_id, f"no result returned by batch {batch_id}")
+            # Anything in this batch that failed is no longer in flight and goes into the next batch
+            del self.outstanding[batch_id]
+            self.save()
+            ingested += 1
+        return ingested
+
+    def ingest(self, results_path: str) -> set:
+        """
+        Applies a results file and advances every game whose requests are now all answered.
+        Returns the custom ids that had a line in the file, successful or not.
+        """
+        touched = set()
+        seen = set()
+
+        with open(results_path, "r") as f:
+            for line in f:
+                if not line.strip():
+                    continue
+                result = json.loads(line)
+                seen.add(result["custom_id"])
+                response = result.get("response") or {}
+                if result.get("error") or response.get("status_code") != 200:
+                    self.record_error(result["custom_id"], error_message(result))
+                    continue
+
+                game_id, step, i = result["custom_id"].split(":")
+                game = self.games.get(game_id)
+                # Results for a step the game has already moved past are stale and ignored
+                if game is None or game.step != int(step):
+                    continue
+                game.pending[int(i)]["response"] = output_text(response["body"])
+                touched.add(game_id)
+
+        for game_id in touched:
+            game = self.games[game_id]
+            game.advance()
+            self.flush_game(game)
+
+        return seen
+
+    def record_error(self, custom_id: str, message: str):
+        """
+        Logs a failed request and keeps the error with it, so the limit check in submit() can report why.
+        """
+        game_id, step, i = custom_id.split(":")
+        game = self.games.get(game_id)
+        if game is None or game.step != int(step) or game.state == "done":
+            return
+        request = game.pending[int(i)]
+        request["error"] = message
+        print(f"Batch request {custom_id} failed (attempt {request['attempts']} of {self.max_attempts}): {message}")
+        self.save_game(game)
+
+    def run(self, poll_interval: float = 60):
+        """
+        Submits and ingests batches until every game is finished.
+        """
+        while not self.done():
+            self.submit()
+            if not self.poll():
+                time.sleep(poll_interval)
@@ -1,13 +1,19 @@
 import os
+import re
 import json
+import math
 import random
 from openai import OpenAI
 from abc import ABC, abstractmethod
 from country import country_choice
 from attributes import ATTRIBUTE_SPACE
 
+QUESTION_FILLER = {"is", "are", "does", "do", "the", "a", "an", "it", "its", "country", "s", "located", "in", "of", "you", "your"}
+
 
 class Brain(ABC):
+    saved_fields = ("history", "questions_asked", "llm_calls")
+
     def __init__(self, client: str, role: str, question_budget: int, model: str, attribute_space: list):
         self.api_client = client
         self.model = model
@@ -20,6 +26,7 @@ class Brain(ABC):
         self.questions_remaining = self.question_budget - self.questions_asked
         self.attribute_space = attribute_space
         self.country_choice = country_choice
+        self.llm_calls = 0
 
     @abstractmethod
     def profile(self) -> str:
@@ -47,48 +54,57 @@ class Brain(ABC):
         return "\n".join(formatted)
 
     @abstractmethod
-    def planning(self, context: str, history: str) -> str:
+    def planning_prompt(self, history: str) -> str:
         # This function creates a plan for the agent
         """
         Reasons about what to do next given profile context and memory.
-        Makes a separate LLM call so reasoning is observable and loggable.
-        Returns a plan string that is passed to the action module.
+        Builds a separate LLM call so reasoning is observable and loggable.
+        Returns the prompt whose response is the plan passed to the action module.
         """
         pass
 
     @abstractmethod
-    def action(self, plan: str) -> str:
+    def action_prompt(self, plan: str) -> str:
         # This function creates an action for the agent
         """
-        Takes the plan and produces the actual game output.
-        Returns a question (Seeker) or answer (Oracle).
+        Takes the plan and builds the call that produces the actual game output.
+        The response is a question (Seeker) or answer (Oracle).
+        The game environment sends these calls in sequence, one state per call.
         """
         pass
 
-    def act(self) -> str:
+    def llm_request(self, input: str) -> dict:
         """
-        Orchestrates the four modules in sequence to build a prompt which is fed into the model.
+        Builds the request body for one LLM call without sending it,
+        so it can either be sent straight away or queued into a batch file.
         """
-        context = self.profile()
-        history = self.memory()
-        self.last_plan = self.planning(context, history)
-        output = self.action(self.last_plan)
-        return output
-    
-    def call_llm(self, input: str) -> str:
-        response = self.api_client.responses.create(
-            model=self.model,
-            instructions=self.profile(),
-            input=input
-        )
+        self.llm_calls += 1
+        return {
+            "model": self.model,
+            "instructions": self.profile(),
+            "input": input
+        }
+
+    def send(self, request: dict) -> str:
+        response = self.api_client.responses.create(**request)
         response = response.output_text.strip()
         return response
 
     def update_history(self, question: str, answer: str): 
         self.history.append({"question": question, "answer": answer})
 
+    def state_dict(self) -> dict:
+        # Everything that changes during a game, so a paused game can be saved and resumed
+        return {name: getattr(self, name, None) for name in self.saved_fields}
+
+    def load_state(self, state: dict):
+        for name, value in state.items():
+            setattr(self, name, value)
+
 
 class Seeker(Brain):
+    saved_fields = Brain.saved_fields + ("candidate_count", "branches", "last_plan", "candidate_file", "thought_file", "branch_limit")
+
     def __init__(self, client: OpenAI, model: str, question_budget: int, attribute_space: list):
         super().__init__(
             client=client,
@@ -98,7 +114,15 @@ class Seeker(Brain):
             attribute_space=attribute_space,
         )
         self.candidate_count = len(self.country_choice)
-        self.n_branches = 5 # controls number of thought branches
+        self.n_branches = 5 # upper limit on thought branches per turn
+        self.min_branches = 2 # always compare at least this many before stopping early
+        self.branch_patience = 2 # stop after this many branches in a row add nothing new
+        self.even_split = 0.45 # a branch this close to halving the candidates can't be meaningfully beaten
+        self.branch_limit = self.n_branches
+        self.candidate_file = "candidate_log.txt"
+        self.thought_file = "tree_of_thoughts.txt"
+        self.branches = []
+        self.last_plan = None
 
     def profile(self) -> str:
         budget_remaining = self.question_budget - self.questions_asked
@@ -118,66 +142,121 @@ class Seeker(Brain):
             f"Removing too many countries could lead to you removing countries that are the correct answer. "
         )
 
-    def tree_of_thought(self, current_candidates: list, history: str) -> str:
-        branches = []
-        current_candidates = self.candidate_list()
+    def branch_target(self, candidate_total: int) -> int:
+        """
+        Sizes the fan-out for this turn. When the remaining budget is shorter than the halvings still needed,
+        one branch more than that number; otherwise scaled down from n_branches as the score falls
+        (half of them at a score of 0), and never more than the number of halvings still needed.
+        """
+        remaining = self.question_budget - self.questions_asked
+        needed = math.ceil(math.log2(candidate_total)) if candidate_total > 1 else 0
+        if remaining < needed:
+            # Every question has to count, but a small field has only so many distinct ways to split it
+            target = needed + 1
+        else:
+            target = min(needed, math.ceil(self.n_branches * (0.5 + self.game.score / 200)))
+        return max(self.min_branches, min(self.n_branches, target))
+
+    def branches_converged(self, branches: list) -> bool:
+        """
+        True once enough branches have been issued: the turn's limit is reached, one branch already
+        splits the candidates about evenly, or the last branch_patience branches each repeated an earlier
+        question without improving on the best split.
+        """
+        if len(branches) >= self.branch_limit:
+            return True
+        if len(branches) < self.min_branches:
+            return False
+
+        seen = set()
+        best = -1
+        stale = 0
+        for b in branches:
+            key = self.question_key(b["question"])
+            quality = self.split_quality(b)
+            stale = stale + 1 if key in seen and quality <= best else 0
+            seen.add(key)
+            best = max(best, quality)
+
+        return best >= self.even_split or stale >= self.branch_patience
+
+    def question_key(self, question: str) -> frozenset:
+        # Drops the filler words so "Is the country in Africa?" and "Is the country located in Africa?" match
+        words = re.findall(r"[a-z0-9]+", question.lower())
+        return frozenset(w for w in words if w not in QUESTION_FILLER)
+
+    def split_quality(self, branch: dict) -> float:
+        # Share of candidates on the smaller side: 0.5 is a perfect halving
+        total = branch["if_yes_count"] + branch["if_no_count"]
+        if branch["question"] == "unknown" or total <= 0:
+            return 0
+        return min(branch["if_yes_count"], branch["if_no_count"]) / total
+
+    def branch_prompt(self, i: int, current_candidates: list) -> str:
+        #print(f"Thinking branch {i}/{self.branch_limit}")
+        return (
+            f"You are on thought {i} of {self.branch_limit}.\n"
+            f"previously asked questions, do not ask these again: {self.history}\n"
+            f"you can ask questions from {self.attribute_space}"
+            f"The number of candidate countries is: {self.candidate_count}.\n"
+            f"The remaining candidate countries are {current_candidates}"
+            f"Estimate how many candidates would remain for both a yes and no answer.\n"
+            f"IMPORTANT: IF_YES_COUNT + IF_NO_COUNT must equal exactly {len(current_candidates)}.\n\n"
+            f"QUESTION: <your question>\n"
+            f"IF_YES_COUNT: <number>\n"
+            f"IF_NO_COUNT: <number>\n"
+        )
 
-        for i in range(1, self.n_branches + 1):
-            #print(f"Thinking branch {i}/{self.n_branches}")
-            user = (
-                f"You are on thought {i} of {self.n_branches}.\n"
-                f"previously asked questions, do not ask these again: {self.history}\n"
-                f"you can ask questions from {self.attribute_space}"
-                f"The number of candidate countries is: {self.candidate_count}.\n"
-                f"The remaining candidate countries are {current_candidates}"
-                f"Estimate how many candidates would remain for both a yes and no answer.\n"
-                f"IMPORTANT: IF_YES_COUNT + IF_NO_COUNT must equal exactly {len(current_candidates)}.\n\n"
-                f"QUESTION: <your question>\n"
-                f"IF_YES_COUNT: <number>\n"
-                f"IF_NO_COUNT: <number>\n"
-            )
-            response = self.call_llm(user)
-
-            try:
-                question = [l for l in response.split("\n") if l.startswith("QUESTION:")][0].replace("QUESTION:", "").strip()
-                yes = int([l for l in response.split("\n") if l.startswith("IF_YES_COUNT:")][0].replace("IF_YES_COUNT:", "").strip())
-                no = int([l for l in response.split("\n") if l.startswith("IF_NO_COUNT:")][0].replace("IF_NO_COUNT:", "").strip())
-            except (IndexError, ValueError):
-                question = "unknown"
-                yes = no = len(current_candidates)
-
-            branches.append({
-                "branch_number": i,
-                "score": self.game.score,
-                "question": question,
-                "if_yes_count": yes,
-                "if_no_count": no,
-            })
-        
+    def parse_branch(self, i: int, response: str, current_candidates: list) -> dict:
+        try:
+            question = [l for l in response.split("\n") if l.startswith("QUESTION:")][0].replace("QUESTION:", "").strip()
+            yes = int([l for l in response.split("\n") if l.startswith("IF_YES_COUNT:")][0].replace("IF_YES_COUNT:", "").strip())
+            no = int([l for l in response.split("\n") if l.startswith("IF_NO_COUNT:")][0].replace("IF_NO_COUNT:", "").strip())
+        except (IndexError, ValueError):
+            question = "unknown"
+            yes = no = len(current_candidates)
+
+        return {
+            "branch_number": i,
+            "score": self.game.score,
+            "question": question,
+            "if_yes_count": yes,
+            "if_no_count": no,
+        }
+
+    def record_branches(self, branches: list) -> list:
         #print(branches)
-        self.log_branches(branches)
         self.branches = branches
+        self.log_branches(branches)
         return branches
 
+    def calls_saved_by_sizing(self) -> int:
+        # Branch calls skipped by branch_target choosing fewer than n_branches
+        return self.n_branches - self.branch_limit
+
+    def calls_saved_by_cutoff(self) -> int:
+        # Branch calls skipped by stopping before the turn's branch_limit once branches converged
+        return self.branch_limit - len(self.branches)
+
     def log_branches(self, branches: list):
         current_candidates = self.candidate_list()
-        with open("tree_of_thoughts.txt", "a") as f:
-            f.write(f"\nQuestion number: {self.questions_asked + 1} / {self.question_budget} |Branches evaluated: {len(branches)} | Candidates: {len(current_candidates)}\n")
-            for b in branches:
-                f.write(f"Branch {b['branch_number']}: {b['question']} | IF_YES_COUNT: {b['if_yes_count']} | IF_NO_COUNT: {b['if_no_count']}\n")
+        lines = [f"\nQuestion number: {self.questions_asked + 1} / {self.question_budget} |Branches evaluated: {len(branches)} | Branch limit: {self.branch_limit} / {self.n_branches} | Calls saved by sizing: {self.calls_saved_by_sizing()} | Calls saved by cut-off: {self.calls_saved_by_cutoff()} | Candidates: {len(current_candidates)}\n"]
+        for b in branches:
+            lines.append(f"Branch {b['branch_number']}: {b['question']} | IF_YES_COUNT: {b['if_yes_count']} | IF_NO_COUNT: {b['if_no_count']}\n")
+        self.game.write_later("log", self.thought_file, "".join(lines))
 
-    def planning(self, context: str, history: str) -> str:
+    def planning_prompt(self, history: str) -> str:
+        branches = self.branches
         current_candidates = self.candidate_list()
-        branches = self.tree_of_thought(current_candidates, history)
         branches_summary = "\n".join([
             f"Option {b['branch_number']}: {b['question']} | If the answer is yes: {b['if_yes_count']} | If the reply is no: {b['if_no_count']}"
             for b in branches
         ])
 
-        user = (
+        return (
             f"Game history so far:\n{history}\n\n "
             f"The current score is {self.game.score}. You want to reduce the amount of candidates remaining as much as possible to help minimise the score. "
-            f"You have already gone through and decided 5 questions you may ask, you must choose one of these questions: {branches_summary}"
+            f"You have already gone through and decided {len(branches)} questions you may ask, you must choose one of these questions: {branches_summary}"
             f"You have {self.question_budget - self.questions_asked} questions remaining.\n\n"
             f"Based on the current chat history, reason through the following steps:\n"
             f"1. What do you know so far about the country?\n"
@@ -188,54 +267,63 @@ class Seeker(Brain):
             f"REASONING: <your reasoning>\n"
             f"CANDIDATES: <comma seperated list of countries which you believe the hidden country may be.>\n"
             f"STRATEGY: <your next question strategy which must stem from {branches}>\n"
+            f"BRANCH: <the option number of the question you chose>\n"
         )
-        plan = self.call_llm(user)
-        #print(plan)
-        return plan
 
-    def action(self, plan: str) -> str:
-        
+    def read_candidates(self, plan: str) -> bool:
+        """
+        Reads the candidate list out of the plan.
+        Returns False once the seeker is ready to stop asking and guess.
+        """
         try:
             count_line = [line for line in plan.split("\n") if line.startswith("CANDIDATES:")][0]
             self.candidate_count = count_line.replace("CANDIDATES:", "").strip()
         except (IndexError, ValueError):
             self.candidate_count = len(self.country_choice)
 
-        if len(self.candidate_count) <= 2:
-            return None
+        return len(self.candidate_count) > 2
+
+    def chosen_branch(self, plan: str):
+        """
+        Returns the branch the plan picked by its BRANCH: number,
+        falling back to the branch whose question matches the one asked. None if neither is found.
+        """
+        try:
+            number = int([line for line in plan.split("\n") if line.startswith("BRANCH:")][0].replace("BRANCH:", "").strip())
+            return next(b for b in self.branches if b["branch_number"] == number)
+        except (IndexError, ValueError, StopIteration):
+            pass
 
-        user = (
+        asked = self.question_key(self.game.question or "")
+        return next((b for b in self.branches if self.question_key(b["question"]) == asked), None)
+
+    def action_prompt(self, plan: str) -> str:
+        return (
             f"Your reasoning and strategy:\n{plan}\n\n"
-            f"Based on your strategy, output your next yes/no question. "
+            f"Based on your strategy, output your next yes/no question, worded as in the option you chose. "
             f"Just the question, no explanation"
         )
 
-        self.questions_asked += 1
-        return self.call_llm(user)
-
-    def make_guess(self) -> str:
-        user = (
+    def guess_prompt(self) -> str:
+        return (
             f"Game history:\n{self.memory()}\n\n "
             f"Based on everything you know, what is your final guess for the country? "
             f"Respond with only the country name. "
         )
-        return self.call_llm(user)
 
     def candidate_list(self) -> list:
-        if not os.path.exists("candidate_log.txt") or os.path.getsize("candidate_log.txt") == 0:
+        if not os.path.exists(self.candidate_file) or os.path.getsize(self.candidate_file) == 0:
             return self.country_choice
 
-        with open("candidate_log.txt", "r") as f:
+        with open(self.candidate_file, "r") as f:
             last_line = f.readlines()[-1].strip()
         
         current_candidates = last_line.split(", ") if last_line else self.country_choice
         return current_candidates
 
     
-    def update_candidate_file(self, question: str, answer: str):
-        current_candidates = self.candidate_list()
-    
-        user = (
+    def update_prompt(self, current_candidates: list) -> str:
+        return (
             f"Question asked: {self.game.question}\n"
             f"Oracle answered: {self.game.answer}\n\n"
             f"From this list:\n{', '.join(current_candidates)}\n\n"
@@ -243,8 +331,8 @@ class Seeker(Brain):
             f"Label all remaining valid countries with CANDIDATE.\n"
             f"CANDIDATE: <country>\n"
         )
-        response = self.call_llm(user)
-    
+
+    def write_candidates(self, response: str, current_candidates: list):
         candidates = [
             line.replace("CANDIDATE:", "").strip()
             for line in response.split("\n")
@@ -253,11 +341,13 @@ class Seeker(Brain):
         if not candidates:
             candidates = current_candidates
     
-        with open("candidate_log.txt", "w") as f:
+        with open(self.candidate_file, "w") as f:
             f.write(", ".join(candidates))
 
 
 class Oracle(Brain):
+    saved_fields = Brain.saved_fields + ("hidden_country", "current_question", "last_plan")
+
     def __init__(self, client: OpenAI, model: str, question_budget: int, country_choice: list, attribute_space: list):
         super().__init__(
             client=client,
@@ -268,6 +358,7 @@ class Oracle(Brain):
         )
         self.hidden_country = random.choice(country_choice)
         self.current_question = None
+        self.last_plan = None
 
     def profile(self) -> str:
         candidate_count = self.game.seeker.candidate_count if hasattr(self, 'game') else "unknown"
@@ -286,9 +377,9 @@ class Oracle(Brain):
     def receive_question(self, question: str):
         self.current_question = question
 
-    def planning(self, context: str, history: str) -> str:
+    def planning_prompt(self, history: str) -> str:
         candidate_count = self.game.seeker.candidate_count if hasattr(self, 'game') else "unknown"
-        user = (
+        return (
             f"Hidden country: {self.hidden_country}\n"
             f"Game history:\n{history}\n\n"
             f"The seeker has asked: {self.current_question}\n"
@@ -305,12 +396,9 @@ class Oracle(Brain):
             f"IMPACT: <how a direct answer would affect the candidate list>\n"
             f"STRATEGY: <how you will answer to minimise candidate elimination>\n"
         )
-        return self.call_llm(user)
 
-    def action(self, question: str) -> str:
-        self.receive_question(question)
-        plan = self.planning(self.current_question, self.memory())
-        user = (
+    def action_prompt(self, plan: str) -> str:
+        return (
             f"Hidden country: {self.hidden_country}\n"
             f"Your strategic reasoning:\n{plan}\n\n"
             f"Now deliver your final answer to: {self.current_question}\n\n"
@@ -320,6 +408,4 @@ class Oracle(Brain):
             f"- Be as uninformative as truthfully possible.\n"
             f"- Do not offer help or address the seeker as a human.\n"
         )
-        answer = self.call_llm(user)
-        return answer
 
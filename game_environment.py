@@ -1,10 +1,21 @@
 from bot import Seeker, Oracle
+from game_store import GameStore
+import os
 import re
 
 class GameEnvironment:
-    def __init__(self, seeker: Seeker, oracle: Oracle):
+    """
+    Runs one game as a state machine. Each state queues the LLM requests it needs in self.pending;
+    once every pending request has a response, advance() moves the game to its next state.
+    run() answers the requests straight away, the batch runner answers them from batch result files.
+    Appends to the store and log files are queued in self.outbox and only written by flush(),
+    so a resumed batch game can undo a cut-short flush with rewind_flush() and never writes a record twice.
+    """
+    def __init__(self, seeker: Seeker, oracle: Oracle, store: GameStore = None, sequential_branches: bool = True, verbose: bool = True):
         self.seeker = seeker
         self.oracle = oracle
+        self.store = store
+        self.game_id = store.new_game_id() if store else None
         self.score = (self.seeker.candidate_count / len(self.seeker.country_choice)) * 100
         self.question_budget = seeker.question_budget
         self.game_over = False
@@ -12,41 +23,181 @@ class GameEnvironment:
         self.correct = None
         self.question = None
         self.answer = None
+        self.failed = None
+
+        self.state = None
+        self.step = 0
+        self.turn = 1
+        self.pending = []
+        self.candidates_before = None
+        self.calls_before = None
+        self.outbox = []
+        self.flush_offsets = {}
+        # Issue branches past min_branches one at a time so they can stop early; when False all of the
+        # turn's branches go out together, which costs more calls but fewer rounds in batch mode
+        self.sequential_branches = sequential_branches
+        self.verbose = verbose # print the game as it is played; off when many games run at once
 
     def run(self):
-        turn = 1
-        print(f"The chosen country: {self.oracle.hidden_country}. THIS IS HIDDEN FROM THE SEEKER. ")
-        print(f"Oracle: I've chosen my country, ask your first question...\n")
-        print(f"The question budget for this round is {self.seeker.question_budget}")
+        self.start()
+        self.flush()
+        while self.state != "done":
+            for request in self.pending:
+                request["response"] = self.brain(request["role"]).send(request["body"])
+            self.advance()
+            self.flush()
+
+    def write_later(self, kind: str, path: str, payload):
+        """
+        Queues an append: kind is "turn" or "game" for store records, "log" for a line of text to path.
+        """
+        self.outbox.append([kind, path, payload])
+        if path not in self.flush_offsets:
+            self.flush_offsets[path] = os.path.getsize(path) if os.path.exists(path) else 0
+
+    def flush(self):
+        """
+        Appends everything in the outbox to the store and log files.
+        """
+        for kind, path, payload in self.outbox:
+            if kind == "turn":
+                self.store.append_turn(self.game_id, payload)
+            elif kind == "game":
+                self.store.append_game(self.game_id, payload)
+            else:
+                with open(path, "a") as f:
+                    f.write(payload)
+
+        self.outbox = []
+        self.flush_offsets = {}
+
+    def rewind_flush(self):
+        """
+        Crash recovery only. flush_offsets holds each file's size from before the first queued write and is saved
+        in the snapshot; truncating back to it undoes a flush that was cut short, so the next flush writes it exactly once.
+        """
+        for path, offset in self.flush_offsets.items():
+            if os.path.exists(path) and os.path.getsize(path) > offset:
+                with open(path, "r+") as f:
+                    f.truncate(offset)
+
+    def say(self, message: str):
+        if self.verbose:
+            print(message)
+
+    def start(self):
+        self.say(f"The chosen country: {self.oracle.hidden_country}. THIS IS HIDDEN FROM THE SEEKER. ")
+        self.say(f"Oracle: I've chosen my country, ask your first question...\n")
+        self.say(f"The question budget for this round is {self.seeker.question_budget}")
 
         #print("=== SEEKER PROFILE ===")
         #print(self.seeker.profile())
         #print("=== ORACLE PROFILE ===")
         #print(self.oracle.profile())
 
-        while self.seeker.questions_asked < self.question_budget:
-            self.question = self.seeker.act()
-            
-            self.log_candidates(turn, self.seeker.last_plan)
-            
-            if self.question is None:
-                break
+        # Every game starts from the full country list, not whatever the last game left in the candidate file
+        open(self.seeker.candidate_file, "w").close()
+        self.next_turn()
+
+    def brain(self, role: str):
+        return self.seeker if role == self.seeker.role else self.oracle
+
+    def queue(self, state: str, brain, prompts: list):
+        self.state = state
+        self.step += 1
+        self.pending = [
+            {"role": brain.role, "body": brain.llm_request(prompt), "response": None, "attempts": 0, "error": None}
+            for prompt in prompts
+        ]
+
+    def ready(self) -> bool:
+        return all(request["response"] is not None for request in self.pending)
+
+    def next_turn(self):
+        if self.seeker.questions_asked >= self.question_budget:
+            self.queue("guess", self.seeker, [self.seeker.guess_prompt()])
+            return
+
+        self.candidates_before = len(self.seeker.candidate_list())
+        self.calls_before = self.llm_calls()
+        current_candidates = self.seeker.candidate_list()
+        self.seeker.branches = []
+        self.seeker.branch_limit = self.seeker.branch_target(len(current_candidates))
+        # The first few branches are always needed, so they go out together; in sequential mode the rest follow one at a time
+        first = min(self.seeker.min_branches, self.seeker.branch_limit) if self.sequential_branches else self.seeker.branch_limit
+        self.queue("branch", self.seeker, [
+            self.seeker.branch_prompt(i, current_candidates)
+            for i in range(1, first + 1)
+        ])
+
+    def advance(self):
+        """
+        Consumes the responses to the pending requests and queues the next state's requests.
+        """
+        if self.state == "done" or not self.ready():
+            return
+
+        responses = [request["response"] for request in self.pending]
+        response = responses[0]
+
+        if self.state == "branch":
+            current_candidates = self.seeker.candidate_list()
+            branches = self.seeker.branches
+            for response in responses:
+                branches.append(self.seeker.parse_branch(len(branches) + 1, response, current_candidates))
+
+            if self.sequential_branches and not self.seeker.branches_converged(branches):
+                self.queue("branch", self.seeker, [self.seeker.branch_prompt(len(branches) + 1, current_candidates)])
+            else:
+                self.seeker.record_branches(branches)
+                self.queue("plan", self.seeker, [self.seeker.planning_prompt(self.seeker.memory())])
+
+        elif self.state == "plan":
+            self.seeker.last_plan = response
+            if self.seeker.read_candidates(response):
+                self.seeker.questions_asked += 1
+                self.queue("ask", self.seeker, [self.seeker.action_prompt(response)])
+            else:
+                self.question = None
+                self.log_candidates(self.turn, self.seeker.last_plan)
+                self.queue("guess", self.seeker, [self.seeker.guess_prompt()])
+
+        elif self.state == "ask":
+            self.question = response
+            self.log_candidates(self.turn, self.seeker.last_plan)
+            self.say(f"Seeker: {self.question}")
+            self.oracle.receive_question(self.question)
+            self.queue("oracle_plan", self.oracle, [self.oracle.planning_prompt(self.oracle.memory())])
+
+        elif self.state == "oracle_plan":
+            self.oracle.last_plan = response
+            self.queue("oracle_answer", self.oracle, [self.oracle.action_prompt(response)])
+
+        elif self.state == "oracle_answer":
+            self.answer = response
+            self.say(f"Oracle: {self.answer}")
 
-            print(f"Seeker: {self.question}")
-            answer = self.oracle.action(self.question)
-            self.answer = answer
-            print(f"Oracle: {answer}")
+            self.seeker.update_history(self.question, self.answer)
+            self.oracle.update_history(self.question, self.answer)
 
-            self.seeker.update_history(self.question, answer)
-            self.oracle.update_history(self.question, answer)
+            self.queue("update", self.seeker, [self.seeker.update_prompt(self.seeker.candidate_list())])
 
-            self.seeker.update_candidate_file(self.question, answer)
-            #self.score -= 10
-            turn += 1
+        elif self.state == "update":
+            self.seeker.write_candidates(response, self.seeker.candidate_list())
+            self.score = (len(self.seeker.candidate_list()) / len(self.seeker.country_choice)) * 100
+            self.log_turn(self.turn, self.candidates_before, self.calls_before)
+            self.turn += 1
+            self.next_turn()
 
-        self.guess = self.seeker.make_guess()
+        elif self.state == "guess":
+            self.guess = response
+            self.finish()
+
+    def finish(self):
+        self.state = "done"
+        self.pending = []
         self.correct = self.guess.lower() == self.oracle.hidden_country.lower()
-        
+
         if self.correct:
             winner = "Seeker"
             self.game_over = True
@@ -54,15 +205,62 @@ class GameEnvironment:
             winner = "Oracle"
             self.game_over = True
 
-        print(f"\nThe Seeker guessed {self.guess}")
-        print(f"The seeker used {self.seeker.questions_remaining} / {self.seeker.question_budget} questions. ")
-        print(f"\n{winner} wins! The correct answer was {self.oracle.hidden_country}")
+        if self.store:
+            self.write_later("game", self.store.games_path, {**self.result(), "turns": self.turn - 1})
+
+        self.say(f"\nThe Seeker guessed {self.guess}")
+        self.say(f"The seeker used {self.seeker.questions_remaining} / {self.seeker.question_budget} questions. ")
+        self.say(f"\n{winner} wins! The correct answer was {self.oracle.hidden_country}")
 
         #print(f"\nSeeker's final guess: {self.guess}")
         #print(f"Correct answer: {self.oracle.hidden_country}")
         #print(f"Correct: {self.correct}")
         #print(f"Score: {self.score}")
 
+    def fail(self, error: str):
+        """
+        Ends a game that cannot continue, e.g. a batch request that keeps failing, and records why.
+        """
+        self.state = "done"
+        self.pending = []
+        self.failed = error
+        self.game_over = True
+
+        if self.store:
+            self.write_later("game", self.store.games_path, {**self.result(), "turns": self.turn - 1})
+
+    def snapshot(self) -> dict:
+        """
+        Everything needed to pick the game back up in a new process, as plain JSON-able data.
+        """
+        return {
+            "game_id": self.game_id,
+            "score": self.score,
+            "state": self.state,
+            "step": self.step,
+            "turn": self.turn,
+            "pending": self.pending,
+            "game_over": self.game_over,
+            "guess": self.guess,
+            "correct": self.correct,
+            "failed": self.failed,
+            "question": self.question,
+            "answer": self.answer,
+            "candidates_before": self.candidates_before,
+            "calls_before": self.calls_before,
+            "outbox": self.outbox,
+            "flush_offsets": self.flush_offsets,
+            "seeker": self.seeker.state_dict(),
+            "oracle": self.oracle.state_dict(),
+        }
+
+    def restore(self, snapshot: dict):
+        snapshot = dict(snapshot)
+        self.seeker.load_state(snapshot.pop("seeker"))
+        self.oracle.load_state(snapshot.pop("oracle"))
+        for name, value in snapshot.items():
+            setattr(self, name, value)
+
     def result(self) -> dict:
         if not self.game_over:
             return None
@@ -71,9 +269,66 @@ class GameEnvironment:
             "correct_answer": self.oracle.hidden_country,
             "correct": self.correct,
             "question_asked": self.seeker.questions_asked,
-            "score": self.score
+            "score": self.score,
+            "llm_calls": self.llm_calls(),
+            "failed": self.failed
         }
 
+    def llm_calls(self) -> int:
+        return self.seeker.llm_calls + self.oracle.llm_calls
+
+    def answer_polarity(self, text: str):
+        """
+        Classifies a free-text reply as "yes" or "no" from its first yes/no word, or None if it has none.
+        """
+        match = re.search(r"\b(yes|true|no|not|false)\b", (text or "").lower())
+        if not match:
+            return None
+        return "yes" if match.group(1) in ("yes", "true") else "no"
+
+    def oracle_polarity(self):
+        # The oracle's plan states the plain factual answer; its delivered answer is deliberately vaguer
+        try:
+            correct = [line for line in self.oracle.last_plan.split("\n") if line.startswith("CORRECT_ANSWER:")][0]
+            polarity = self.answer_polarity(correct.replace("CORRECT_ANSWER:", ""))
+        except (IndexError, AttributeError):
+            polarity = None
+        return polarity or self.answer_polarity(self.answer)
+
+    def estimated_split(self, branch: dict, polarity: str):
+        """
+        The seeker's own estimate of how many candidates would remain after the answer to the branch it chose.
+        Returns None if no branch was identified or the answer is not a clear yes/no.
+        """
+        if branch is None or polarity is None:
+            return None
+        return branch["if_yes_count"] if polarity == "yes" else branch["if_no_count"]
+
+    def log_turn(self, turn: int, candidates_before: int, calls_before: int):
+        if not self.store:
+            return
+        candidates_after = len(self.seeker.candidate_list())
+        branch = self.seeker.chosen_branch(self.seeker.last_plan)
+        polarity = self.oracle_polarity()
+        estimated_after = self.estimated_split(branch, polarity)
+        self.write_later("turn", self.store.turns_path, {
+            "turn": turn,
+            "question": self.question,
+            "answer": self.answer,
+            "answer_polarity": polarity,
+            "chosen_branch": branch["branch_number"] if branch else None,
+            "branches_evaluated": len(getattr(self.seeker, "branches", [])),
+            "max_branches": self.seeker.n_branches,
+            "branch_limit": self.seeker.branch_limit,
+            "calls_saved_by_sizing": self.seeker.calls_saved_by_sizing(),
+            "calls_saved_by_cutoff": self.seeker.calls_saved_by_cutoff(),
+            "candidates_before": candidates_before,
+            "candidates_after": candidates_after,
+            "estimated_after": estimated_after,
+            "split_error": abs(estimated_after - candidates_after) if estimated_after is not None else None,
+            "llm_calls": self.llm_calls() - calls_before,
+        })
+
     def log_candidates(self, turn: int, plan: str):
         #print(f"RAW PLAN:\n{plan}\n") #TEMPORARY
         try: 
@@ -84,5 +339,4 @@ class GameEnvironment:
 
         code_count = self.seeker.candidate_count
         
-        with open("candidate_log.txt", "a") as f:
-            f.write(f"log_candidate | Turn {turn} | Running Score: {code_count} | The last question: {self.question} | Candidates: {candidates}\n")
+        self.write_later("log", self.seeker.candidate_file, f"log_candidate | Turn {turn} | Running Score: {code_count} | The last question: {self.question} | Candidates: {candidates}\n")
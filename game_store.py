@@ -0,0 +1,50 @@
+import os
+import json
+import uuid
+
+
+class GameStore:
+    """
+    Append-only store of per-turn and per-game records.
+    Each record is one JSON line, so files can be appended to while games run
+    and read back one line at a time without loading everything into memory.
+    Every record carries its game_id so turns can be joined back to games.
+    """
+    def __init__(self, directory: str = "results"):
+        self.directory = directory
+        self.games_path = os.path.join(directory, "games.jsonl")
+        self.turns_path = os.path.join(directory, "turns.jsonl")
+        os.makedirs(directory, exist_ok=True)
+
+    def new_game_id(self) -> str:
+        return uuid.uuid4().hex
+
+    def append_turn(self, game_id: str, record: dict):
+        self._append(self.turns_path, {"game_id": game_id, **record})
+
+    def append_game(self, game_id: str, record: dict):
+        self._append(self.games_path, {"game_id": game_id, **record})
+
+    def iter_turns(self):
+        return self._iter(self.turns_path)
+
+    def iter_games(self):
+        return self._iter(self.games_path)
+
+    def _append(self, path: str, record: dict):
+        with open(path, "a") as f:
+            f.write(json.dumps(record) + "\n")
+
+    def _iter(self, path: str):
+        if not os.path.exists(path):
+            return
+        with open(path, "r") as f:
+            for line in f:
+                line = line.strip()
+                if not line:
+                    continue
+                try:
+                    yield json.loads(line)
+                except json.JSONDecodeError:
+                    # A game killed mid-write can leave a partial last line
+                    continue
@@ -1,6 +1,7 @@
 from openai import OpenAI
 from bot import Seeker, Oracle
 from game_environment import GameEnvironment
+from game_store import GameStore
 from country import country_choice
 import os
 from attributes import ATTRIBUTE_SPACE
@@ -26,7 +27,9 @@ oracle = Oracle(
     attribute_space=ATTRIBUTE_SPACE,
 )
 
-game = GameEnvironment(seeker, oracle)
+store = GameStore("results")
+
+game = GameEnvironment(seeker, oracle, store=store)
 seeker.game = game
 oracle.game = game
 
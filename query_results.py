@@ -0,0 +1,52 @@
+import sys
+from game_store import GameStore
+
+
+def summarise(store: GameStore) -> dict:
+    """
+    Streams through the stored games and turns once each, keeping only running totals,
+    so it works the same for ten games or millions.
+    """
+    games = wins = questions = llm_calls = failed = 0
+    for game in store.iter_games():
+        # Games that ended on a failing request were never played out, so they are counted apart
+        if game.get("failed"):
+            failed += 1
+            continue
+        games += 1
+        wins += bool(game.get("correct"))
+        questions += game.get("question_asked") or 0
+        llm_calls += game.get("llm_calls") or 0
+
+    turns = estimated_turns = split_error = 0
+    sized_turns = saved_by_sizing = saved_by_cutoff = 0
+    for turn in store.iter_turns():
+        turns += 1
+        # Only turns that logged their branch limit can separate the two kinds of saving
+        if turn.get("branch_limit") is not None:
+            sized_turns += 1
+            saved_by_sizing += turn["calls_saved_by_sizing"]
+            saved_by_cutoff += turn["calls_saved_by_cutoff"]
+        if turn.get("split_error") is not None:
+            estimated_turns += 1
+            split_error += turn["split_error"]
+
+    return {
+        "games": games,
+        "failed_games": failed,
+        "win_rate": wins / games if games else None,
+        "mean_questions_used": questions / games if games else None,
+        "mean_llm_calls_per_game": llm_calls / games if games else None,
+        "turns": turns,
+        "turns_with_estimate": estimated_turns,
+        "mean_split_error": split_error / estimated_turns if estimated_turns else None,
+        "turns_with_branch_limit": sized_turns,
+        "mean_calls_saved_by_sizing": saved_by_sizing / sized_turns if sized_turns else None,
+        "mean_calls_saved_by_cutoff": saved_by_cutoff / sized_turns if sized_turns else None,
+    }
+
+
+if __name__ == "__main__":
+    directory = sys.argv[1] if len(sys.argv) > 1 else "results"
+    for key, value in summarise(GameStore(directory)).items():
+        print(f"{key}: {value}")